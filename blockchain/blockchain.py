@@ -1,4 +1,5 @@
 import hashlib
+import hmac
 import json
 import time
 import threading
@@ -6,6 +7,15 @@ import socket
 import os
 from flask import Flask, render_template, request, jsonify
 
+# Clave compartida de la red para firmar los snapshots de la cadena
+def get_snapshot_key():
+    key = os.environ.get("WOODSAFE_SNAPSHOT_KEY")
+    return key.encode() if key else None
+
+if get_snapshot_key() is None:
+    print("⚠️ WOODSAFE_SNAPSHOT_KEY no está definida: los snapshots no se firmarán "
+          "y no se aceptarán snapshots de otros nodos")
+
 # Clase para representar una transacción
 class Transaction:
     def __init__(self, sender, receiver, amount, file_hash=None, timestamp=None):  # Cambio aquí
@@ -61,14 +71,38 @@ class Block:
             "hash": self.hash
         }
 
+    @staticmethod
+    def from_dict(block_dict):
+        transactions = [
+            Transaction(
+                tx["sender"],
+                tx["receiver"],
+                tx["amount"],
+                tx.get("file_hash"),
+                tx["timestamp"]  # ¡Este es el cambio clave!
+            ) for tx in block_dict["transactions"]
+        ]
+        block = Block(
+            block_dict["index"],
+            block_dict["previous_hash"],
+            transactions,
+            block_dict["nonce"],
+            block_dict["timestamp"]  # ¡Nuevo parámetro!
+        )
+        block.hash = block_dict["hash"]
+        return block
+
 # Clase para representar la blockchain
 class Blockchain:
-    def __init__(self):
+    def __init__(self, prune_history=False):
         self.chain = [self.create_genesis_block()]
         self.pending_transactions = []
         self.difficulty = 4
         self.mining_reward = 10
-        self.mining_lock = threading.Lock()
+        self.mining_lock = threading.RLock()  # Protege la cadena al minar y al reemplazarla
+        self.snapshot = None  # Último checkpoint firmado de la cadena
+        self.snapshot_interval = 5  # Bloques entre snapshots
+        self.prune_history = prune_history  # Descartar bloques anteriores al checkpoint
 
     def create_genesis_block(self):
         return Block(0, "0", [])
@@ -76,6 +110,17 @@ class Blockchain:
     def get_last_block(self):
         return self.chain[-1]
 
+    def get_length(self):
+        """Longitud lógica de la cadena, aunque se hayan podado bloques antiguos"""
+        return self.get_last_block().index + 1
+
+    def get_block(self, index):
+        """Devuelve el bloque con ese índice o None si no existe o fue podado"""
+        position = index - self.chain[0].index
+        if 0 <= position < len(self.chain):
+            return self.chain[position]
+        return None
+
     def add_transaction(self, transaction):
         if transaction not in self.pending_transactions:
             self.pending_transactions.append(transaction)   
@@ -85,10 +130,14 @@ class Blockchain:
             if not self.pending_transactions:
                 return
 
-            block = Block(len(self.chain), self.get_last_block().hash, self.pending_transactions.copy())
+            block = Block(self.get_length(), self.get_last_block().hash, self.pending_transactions.copy())
             block.mine_block(self.difficulty)
             self.chain.append(block)
-            self.pending_transactions = [Transaction("SYSTEM", miner_address, self.mining_reward)]
+            # Conservar las transacciones que llegaron mientras se minaba
+            self.pending_transactions = [
+                tx for tx in self.pending_transactions if tx not in block.transactions
+            ] + [Transaction("SYSTEM", miner_address, self.mining_reward)]
+            self.maybe_create_snapshot()
 
     def is_chain_valid(self):
         for i in range(1, len(self.chain)):
@@ -103,16 +152,103 @@ class Blockchain:
 
         return True
 
+    def compute_state(self):
+        """Calcula el índice de archivos y los saldos partiendo del último snapshot"""
+        if self.snapshot:
+            base_index = self.snapshot["index"]
+            file_index = dict(self.snapshot["file_index"])
+            balances = dict(self.snapshot["balances"])
+        else:
+            base_index = -1
+            file_index = {}
+            balances = {}
+
+        for block in self.chain:
+            if block.index <= base_index:
+                continue
+            for tx in block.transactions:
+                balances[tx.sender] = balances.get(tx.sender, 0) - tx.amount
+                balances[tx.receiver] = balances.get(tx.receiver, 0) + tx.amount
+                if tx.file_hash and tx.file_hash not in file_index:
+                    file_index[tx.file_hash] = block.index
+        return file_index, balances
+
+    def maybe_create_snapshot(self):
+        """Crea un snapshot cada `snapshot_interval` bloques"""
+        last_index = self.snapshot["index"] if self.snapshot else 0
+        if self.get_last_block().index - last_index >= self.snapshot_interval:
+            return self.create_snapshot()
+        return None
+
+    def create_snapshot(self):
+        tip = self.get_last_block()
+        file_index, balances = self.compute_state()
+        snapshot = {
+            "index": tip.index,
+            "tip_hash": tip.hash,
+            "block": tip.to_dict(),
+            "file_index": file_index,
+            "balances": balances
+        }
+        snapshot["digest"] = Blockchain.snapshot_digest(snapshot)
+        key = get_snapshot_key()
+        snapshot["signature"] = hmac.new(key, snapshot["digest"].encode(), hashlib.sha256).hexdigest() if key else None
+        self.snapshot = snapshot
+        print(f"📸 Snapshot creado en el bloque {tip.index}")
+
+        if self.prune_history:
+            self.prune()
+        return snapshot
+
+    def prune(self):
+        """Descarta los bloques anteriores al checkpoint, conservando el bloque ancla"""
+        if self.snapshot:
+            self.chain = [block for block in self.chain if block.index >= self.snapshot["index"]]
+
+    @staticmethod
+    def snapshot_digest(snapshot):
+        snapshot_string = json.dumps({
+            "index": snapshot["index"],
+            "tip_hash": snapshot["tip_hash"],
+            "file_index": snapshot["file_index"],
+            "balances": snapshot["balances"]
+        }, sort_keys=True).encode()
+        return hashlib.sha256(snapshot_string).hexdigest()
+
+    @staticmethod
+    def verify_snapshot(snapshot):
+        """Comprueba el digest, la firma y que el bloque ancla corresponda al tip"""
+        key = get_snapshot_key()
+        if key is None:
+            print("⚠️ Snapshot rechazado: WOODSAFE_SNAPSHOT_KEY no está definida")
+            return False
+        try:
+            if Blockchain.snapshot_digest(snapshot) != snapshot["digest"]:
+                return False
+            expected_signature = hmac.new(key, snapshot["digest"].encode(), hashlib.sha256).hexdigest()
+            if not hmac.compare_digest(expected_signature, snapshot["signature"] or ""):
+                return False
+            anchor = Block.from_dict(snapshot["block"])
+            return (
+                anchor.index == snapshot["index"] and
+                anchor.hash == snapshot["tip_hash"] and
+                anchor.calculate_hash() == anchor.hash
+            )
+        except (KeyError, TypeError):
+            return False
+
 # Clase para representar un nodo P2P
 class P2PNode:
     nodes = {}
 
-    def __init__(self, node_id, port):
+    def __init__(self, node_id, port, prune_history=False, peers=None):
         self.node_id = node_id
         self.port = port
         self.peers = {}
         self.files = {}
-        self.blockchain = Blockchain()
+        self.blockchain = Blockchain(prune_history)
+        self.sync_delay = 1  # Segundos de espera tras minar antes de propagar
+        self.client_timeout = 30  # Segundos sin actividad antes de cerrar una conexión entrante
         self.storage_dir = f"node_{node_id}_files"
         os.makedirs(self.storage_dir, exist_ok=True)
 
@@ -121,8 +257,13 @@ class P2PNode:
         self.server.bind(("127.0.0.1", self.port))
         self.server.listen(5)
         P2PNode.nodes[node_id] = self
-        self.connect_to_network()
-        self.sync_with_network()
+        if peers is None:
+            self.connect_to_network()
+            self.sync_with_network()
+        else:
+            # Nodo en otro proceso: los peers solo son accesibles por sus puertos TCP
+            self.peers = dict(peers)
+            self.sync_with_peers()
         print(f"Nodo {node_id} creado en puerto {port}")
         print(f"Directorio de almacenamiento: {self.storage_dir}")
 
@@ -130,13 +271,89 @@ class P2PNode:
 
     def sync_with_network(self):
         """Sincroniza con la blockchain más larga al iniciar"""
-        if len(P2PNode.nodes) > 1:
-            longest_chain = []
-            for node in P2PNode.nodes.values():
-                if len(node.blockchain.chain) > len(longest_chain):
-                    longest_chain = node.blockchain.chain
-            if longest_chain:
-                self.receive_blockchain([block.to_dict() for block in longest_chain])
+        others = [node for node in P2PNode.nodes.values() if node is not self]
+        if others:
+            self.sync_from_payloads(lambda full: [node.chain_payload(full) for node in others])
+
+    def sync_with_peers(self):
+        """Sincroniza por TCP con la blockchain más larga entre los peers"""
+        return self.sync_from_payloads(
+            lambda full: [self.request_chain(peer_id, full) for peer_id in list(self.peers)]
+        )
+
+    def sync_from_payloads(self, fetch_payloads):
+        """Adopta la cadena más larga de los peers.
+
+        Primero se piden solo los bloques desde el último checkpoint. Un nodo
+        nuevo arranca desde el snapshot firmado y valida solo los bloques
+        posteriores; si guarda historial completo, rellena los anteriores en
+        segundo plano. Si la cadena parcial no se puede empalmar con la local
+        ni hay un snapshot de confianza, se descarga la cadena completa desde
+        el génesis, se valida entera y se vuelve a intentar.
+        """
+        payloads = [payload for payload in fetch_payloads(False) if payload and payload["chain"]]
+        if not payloads:
+            return False
+        best = max(payloads, key=lambda payload: payload["chain"][-1]["index"])
+        if self.receive_blockchain(best["chain"], best["snapshot"]):
+            if not self.blockchain.prune_history and self.blockchain.chain[0].index > 0:
+                threading.Thread(target=self.backfill_history, args=(fetch_payloads,), daemon=True).start()
+            return True
+        if best["chain"][0]["index"] == 0 or best["chain"][-1]["index"] <= self.blockchain.get_last_block().index:
+            return False
+
+        full_payloads = [
+            payload for payload in fetch_payloads(True)
+            if payload and payload["chain"] and payload["chain"][0]["index"] == 0
+        ]
+        if not full_payloads:
+            print(f"⚠️ Ningún peer de {self.node_id} conserva el historial completo")
+            return False
+        longest = max(full_payloads, key=lambda payload: payload["chain"][-1]["index"])
+        self.receive_blockchain(longest["chain"], longest["snapshot"])
+        return self.receive_blockchain(best["chain"], best["snapshot"]) or \
+            self.blockchain.get_last_block().hash == longest["chain"][-1]["hash"]
+
+    def backfill_history(self, fetch_payloads):
+        """Descarga y valida los bloques anteriores al checkpoint y comprueba
+        que el estado del snapshot coincide con el historial completo"""
+        for payload in fetch_payloads(True):
+            if not payload or not payload["chain"] or payload["chain"][0]["index"] != 0:
+                continue
+            first = self.blockchain.chain[0]
+            if first.index == 0:
+                return True
+            older = [Block.from_dict(block_dict) for block_dict in payload["chain"] if block_dict["index"] <= first.index]
+            if len(older) != first.index + 1 or older[-1].hash != first.hash or not self.validate_chain(older):
+                continue
+
+            history = Blockchain()
+            history.chain = older
+            file_index, balances = history.compute_state()
+            with self.blockchain.mining_lock:
+                if self.blockchain.chain[0] is not first:
+                    return False
+                snapshot = self.blockchain.snapshot
+                if snapshot and snapshot["index"] == first.index and (
+                    snapshot["file_index"] != file_index or snapshot["balances"] != balances
+                ):
+                    # El historial está enlazado al ancla; el estado firmado no coincide con él
+                    print(f"⚠️ El snapshot del bloque {first.index} no coincide con el historial; se descarta")
+                    self.blockchain.snapshot = None
+                self.blockchain.chain = older[:-1] + self.blockchain.chain
+            print(f"📚 Nodo {self.node_id} recuperó el historial hasta el bloque {first.index}")
+            return True
+        print(f"⚠️ Ningún peer de {self.node_id} conserva el historial completo")
+        return False
+
+    def chain_payload(self, full=False):
+        """Cadena almacenada (o solo desde el último checkpoint), junto con su snapshot"""
+        snapshot = self.blockchain.snapshot
+        start_index = snapshot["index"] if snapshot and not full else 0
+        return {
+            "chain": [block.to_dict() for block in self.blockchain.chain if block.index >= start_index],
+            "snapshot": snapshot
+        }
 
     def connect_to_network(self):
         for node_id, node in P2PNode.nodes.items():
@@ -149,6 +366,8 @@ class P2PNode:
         print(f"[Nodo {self.node_id}] Servidor iniciado en puerto {self.port}")
         while True:
             client_socket, addr = self.server.accept()
+            # Un peer caído a mitad de un mensaje no debe bloquear el hilo para siempre
+            client_socket.settimeout(self.client_timeout)
             threading.Thread(target=self.handle_client, args=(client_socket, addr), daemon=True).start()
 
     def handle_client(self, client_socket, addr):
@@ -169,11 +388,84 @@ class P2PNode:
                         client_socket.sendall("FILE_NOT_FOUND".encode())
                 else:
                     client_socket.sendall("FILE_NOT_FOUND".encode())
+            elif command == "BLOCKCHAIN":
+                payload = P2PNode.receive_payload(client_socket, int(args[0]))
+                self.receive_blockchain(payload["chain"], payload["snapshot"])
+            elif command == "PENDING_TRANSACTIONS":
+                payload = P2PNode.receive_payload(client_socket, int(args[0]))
+                self.receive_pending_transactions(payload)
+            elif command == "GET_CHAIN":
+                full = bool(args) and args[0] == "FULL"
+                P2PNode.send_payload(client_socket, "CHAIN", self.chain_payload(full))
+            else:
+                self.handle_command(client_socket, command, args)
         except Exception as e:
             print(f"[Nodo {self.node_id}] Error en handle_client: {e}")
         finally:
             client_socket.close()
 
+    def handle_command(self, client_socket, command, args):
+        """Punto de extensión para comandos adicionales del protocolo"""
+        client_socket.sendall("UNKNOWN_COMMAND".encode())
+
+    def connect_to_peer(self, peer_id):
+        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        client.settimeout(10)
+        try:
+            client.connect(("127.0.0.1", self.peers[peer_id]))
+        except Exception:
+            client.close()
+            raise
+        return client
+
+    def send_message(self, peer_id, command, payload):
+        """Envía un mensaje JSON a un peer por TCP"""
+        client = self.connect_to_peer(peer_id)
+        try:
+            return P2PNode.send_payload(client, command, payload)
+        finally:
+            client.close()
+
+    def request_chain(self, peer_id, full=False):
+        """Pide a un peer su cadena desde el último checkpoint, o completa si `full`"""
+        try:
+            client = self.connect_to_peer(peer_id)
+        except Exception as e:
+            print(f"[Nodo {self.node_id}] No se pudo conectar con {peer_id}: {e}")
+            return None
+        try:
+            client.sendall(("GET_CHAIN::FULL" if full else "GET_CHAIN").encode())
+            response = client.recv(1024).decode()
+            if not response.startswith("CHAIN::"):
+                return None
+            return P2PNode.receive_payload(client, int(response.split("::")[1]))
+        except Exception as e:
+            print(f"[Nodo {self.node_id}] Error pidiendo la cadena a {peer_id}: {e}")
+            return None
+        finally:
+            client.close()
+
+    @staticmethod
+    def send_payload(sock, command, payload):
+        """Envía la cabecera COMMAND::tamaño, espera READY y envía el JSON"""
+        data = json.dumps(payload).encode()
+        sock.sendall(f"{command}::{len(data)}".encode())
+        if sock.recv(1024).decode() != "READY":
+            return False
+        sock.sendall(data)
+        return True
+
+    @staticmethod
+    def receive_payload(sock, size):
+        sock.sendall("READY".encode())
+        data = bytearray()
+        while len(data) < size:
+            chunk = sock.recv(min(65536, size - len(data)))
+            if not chunk:
+                raise ConnectionError("Conexión cerrada antes de recibir el mensaje completo")
+            data.extend(chunk)
+        return json.loads(data.decode())
+
     def send_file(self, client_socket, file_hash):
         filepath = self.files[file_hash]
         filename = os.path.basename(filepath)
@@ -192,26 +484,28 @@ class P2PNode:
 
     def propagate_transactions(self):
         chain_data = [block.to_dict() for block in self.blockchain.chain]
-        for peer_id in self.peers:
-            if peer_id in P2PNode.nodes:
-                peer_node = P2PNode.nodes[peer_id]
-                try:
-                    peer_node.receive_blockchain(chain_data)
-                except Exception as e:
-                    print(f"Error propagando a {peer_id}: {str(e)}")
+        for peer_id in list(self.peers):
+            try:
+                if peer_id in P2PNode.nodes:
+                    P2PNode.nodes[peer_id].receive_blockchain(chain_data, self.blockchain.snapshot)
+                else:
+                    self.send_message(peer_id, "BLOCKCHAIN", self.chain_payload())
+            except Exception as e:
+                print(f"Error propagando a {peer_id}: {str(e)}")
 
     def propagate_blockchain(self):
         print(f"🔄 Propagando blockchain desde {self.node_id}")
         chain_data = [block.to_dict() for block in self.blockchain.chain]
         
-        for peer_id in self.peers:
-            if peer_id in P2PNode.nodes:
-                peer_node = P2PNode.nodes[peer_id]
-                print(f"📤 Enviando blockchain a {peer_id}")
-                try:
-                    peer_node.receive_blockchain(chain_data)
-                except Exception as e:
-                    print(f"Error propagando a {peer_id}: {str(e)}")
+        for peer_id in list(self.peers):
+            print(f"📤 Enviando blockchain a {peer_id}")
+            try:
+                if peer_id in P2PNode.nodes:
+                    P2PNode.nodes[peer_id].receive_blockchain(chain_data, self.blockchain.snapshot)
+                else:
+                    self.send_message(peer_id, "BLOCKCHAIN", self.chain_payload())
+            except Exception as e:
+                print(f"Error propagando a {peer_id}: {str(e)}")
 
     def upload_file(self, filepath):
         if not os.path.exists(filepath):
@@ -230,13 +524,14 @@ class P2PNode:
 
         # Crear transacción y minar bloque
         transaction = Transaction(self.node_id, "NETWORK", 1, file_hash)
-        self.blockchain.pending_transactions = [
-            tx for tx in self.blockchain.pending_transactions 
-            if tx.sender != "SYSTEM"
-        ]
-        self.blockchain.add_transaction(transaction)
-        self.blockchain.mine_pending_transactions(self.node_id)
-        time.sleep(1)  # Esperar 1 segundo para sincronizar
+        with self.blockchain.mining_lock:
+            self.blockchain.pending_transactions = [
+                tx for tx in self.blockchain.pending_transactions 
+                if tx.sender != "SYSTEM"
+            ]
+            self.blockchain.add_transaction(transaction)
+            self.blockchain.mine_pending_transactions(self.node_id)
+        time.sleep(self.sync_delay)  # Esperar para sincronizar
         # Propagar blockchain y transacciones pendientes
         self.propagate_blockchain()
         self.propagate_pending_transactions()  # Nuevo método para propagar transacciones
@@ -246,10 +541,15 @@ class P2PNode:
     def propagate_pending_transactions(self):
         """Envía transacciones pendientes a todos los peers"""
         transactions_data = [tx.to_dict() for tx in self.blockchain.pending_transactions]
-        for peer_id in self.peers:
+        for peer_id in list(self.peers):
             if peer_id in P2PNode.nodes:
                 peer_node = P2PNode.nodes[peer_id]
                 peer_node.receive_pending_transactions(transactions_data)
+            else:
+                try:
+                    self.send_message(peer_id, "PENDING_TRANSACTIONS", transactions_data)
+                except Exception as e:
+                    print(f"Error propagando transacciones a {peer_id}: {str(e)}")
 
     def receive_pending_transactions(self, transactions_data):
         """Agrega transacciones recibidas a las pendientes"""
@@ -272,11 +572,11 @@ class P2PNode:
             return False
 
         peer_port = self.peers[peer_id]
-        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        client = None
 
         try:
             print(f"[Nodo {self.node_id}] Conectando con peer {peer_id} en puerto {peer_port}...")
-            client.connect(("127.0.0.1", peer_port))
+            client = self.connect_to_peer(peer_id)
             print(f"[Nodo {self.node_id}] Solicitando archivo con hash: {file_hash}")
             client.sendall(f"REQUEST_FILE::{file_hash}".encode())
 
@@ -324,62 +624,128 @@ class P2PNode:
             print(f"[Nodo {self.node_id}] Error en la transferencia: {e}")
             return False
         finally:
-            client.close()
+            if client:
+                client.close()
 
-    def receive_blockchain(self, blockchain_data):
+    def receive_blockchain(self, blockchain_data, snapshot_data=None):
         print(f"📥 Nodo {self.node_id} recibiendo blockchain")
         try:
-            received_chain = []
-            for block_dict in blockchain_data:
-                transactions = [
-                    Transaction(
-                        tx["sender"],
-                        tx["receiver"],
-                        tx["amount"],
-                        tx.get("file_hash"),
-                        tx["timestamp"]  # ¡Este es el cambio clave!
-                    ) for tx in block_dict["transactions"]
-                ]
-                block = Block(
-                    block_dict["index"],
-                    block_dict["previous_hash"],
-                    transactions,
-                    block_dict["nonce"],
-                    block_dict["timestamp"]  # ¡Nuevo parámetro!
-                )
-                block.hash = block_dict["hash"]
-                received_chain.append(block)
-
-            if self.validate_chain(received_chain):
-                if len(received_chain) > len(self.blockchain.chain) or (
-                    len(received_chain) == len(self.blockchain.chain) and 
-                    received_chain[-1].timestamp > self.blockchain.chain[-1].timestamp
-                ):
-                    print(f"✅ Blockchain actualizada en {self.node_id}")
-                    self.blockchain.chain = received_chain
-                    # Sincronizar transacciones pendientes
-                    self.blockchain.pending_transactions = [
-                        tx for tx in self.blockchain.pending_transactions
-                        if not any(tx.file_hash == block_tx.file_hash for block in received_chain for block_tx in block.transactions)
-                    ]
-                    return True
-                else:
-                    print("ℹ️ La cadena recibida no es más larga o actual")
-            else:
-                print("🚫 Cadena recibida no válida")
-                
+            received_chain = [Block.from_dict(block_dict) for block_dict in blockchain_data]
+            if not received_chain:
+                return False
+
+            # Validar y reemplazar bajo el mismo candado que el minado, para que
+            # nunca se añada un bloque minado sobre una cadena ya sustituida
+            with self.blockchain.mining_lock:
+                adopted = self.adopt_chain(received_chain, snapshot_data)
+                remine = adopted and any(tx.file_hash for tx in self.blockchain.pending_transactions)
+            if remine:
+                threading.Thread(target=self.mine_and_propagate, daemon=True).start()
+            return adopted
         except Exception as e:
             print(f"Error al recibir blockchain: {str(e)}")
         return False
 
-    def validate_chain(self, chain):
-        for i in range(1, len(chain)):
+    def mine_and_propagate(self):
+        """Vuelve a minar las transacciones de archivos que quedaron fuera de la cadena adoptada"""
+        with self.blockchain.mining_lock:
+            if not any(tx.file_hash for tx in self.blockchain.pending_transactions):
+                return
+            self.blockchain.mine_pending_transactions(self.node_id)
+        self.propagate_blockchain()
+
+    def adopt_chain(self, received_chain, snapshot_data):
+        """Valida la cadena recibida y la adopta si es más larga; requiere `mining_lock`"""
+        # Se valida todo bloque recibido; solo se omiten los bloques que ya
+        # tenemos localmente (validados al recibirlos) o que cubre un snapshot
+        start = 1
+        checkpoint = None
+        first_index = received_chain[0].index
+        if first_index > 0:
+            local_anchor = self.blockchain.get_block(first_index)
+            if local_anchor and local_anchor.hash == received_chain[0].hash:
+                # Empalmar con los bloques locales previos al primer bloque recibido
+                position = first_index - self.blockchain.chain[0].index
+                received_chain = self.blockchain.chain[:position] + received_chain
+                start = position
+            elif (self.blockchain.prune_history or self.blockchain.get_length() == 1) and \
+                    snapshot_data and Blockchain.verify_snapshot(snapshot_data) and \
+                    self.find_checkpoint(received_chain, snapshot_data) == 0:
+                # Un nodo que poda, o uno que se acaba de unir, arranca desde el
+                # checkpoint de un peer; el bloque ancla se toma del snapshot firmado
+                received_chain[0] = Block.from_dict(snapshot_data["block"])
+                checkpoint = snapshot_data
+            else:
+                print("🚫 Cadena parcial sin bloques locales ni checkpoint de confianza")
+                return False
+
+        if checkpoint is None and self.find_checkpoint(received_chain, self.blockchain.snapshot) is not None:
+            checkpoint = self.blockchain.snapshot
+
+        if not self.validate_chain(received_chain, start):
+            print("🚫 Cadena recibida no válida")
+            return False
+
+        if not (received_chain[-1].index > self.blockchain.get_last_block().index or (
+            received_chain[-1].index == self.blockchain.get_last_block().index and 
+            received_chain[-1].timestamp > self.blockchain.chain[-1].timestamp
+        )):
+            print("ℹ️ La cadena recibida no es más larga o actual")
+            return False
+
+        print(f"✅ Blockchain actualizada en {self.node_id}")
+        old_chain = self.blockchain.chain
+        self.blockchain.chain = received_chain
+        self.blockchain.snapshot = checkpoint
+        if checkpoint and self.blockchain.prune_history:
+            self.blockchain.prune()
+        self.blockchain.maybe_create_snapshot()
+        # Sincronizar transacciones pendientes
+        file_index, _ = self.blockchain.compute_state()
+        self.blockchain.pending_transactions = [
+            tx for tx in self.blockchain.pending_transactions
+            if tx.file_hash not in file_index and
+            not any(tx.file_hash == block_tx.file_hash for block in received_chain for block_tx in block.transactions)
+        ]
+        # Al cambiar de fork, devolver a pendientes las transacciones de archivos
+        # propias que estaban en los bloques descartados
+        received_hashes = {block.hash for block in received_chain}
+        pending_hashes = {tx.file_hash for tx in self.blockchain.pending_transactions}
+        for block in old_chain:
+            if block.hash in received_hashes:
+                continue
+            for tx in block.transactions:
+                if tx.file_hash and tx.file_hash not in file_index and tx.file_hash not in pending_hashes and \
+                        self.node_id in (tx.sender, tx.receiver):
+                    self.blockchain.pending_transactions.append(tx)
+                    pending_hashes.add(tx.file_hash)
+        return True
+
+    @staticmethod
+    def find_checkpoint(chain, snapshot):
+        """Posición del bloque ancla del snapshot dentro de la cadena, o None"""
+        if not snapshot:
+            return None
+        position = snapshot["index"] - chain[0].index
+        if 0 <= position < len(chain) and chain[position].hash == snapshot["tip_hash"]:
+            return position
+        return None
+
+    def validate_chain(self, chain, start=1):
+        """Valida los bloques desde la posición `start`; los anteriores ya son de confianza"""
+        for i in range(start, len(chain)):
             current_block = chain[i]
-            previous_block = chain[i - 1]
 
             if current_block.hash != current_block.calculate_hash():
                 return False
 
+            if i == 0:
+                continue
+            previous_block = chain[i - 1]
+
+            if current_block.index != previous_block.index + 1:
+                return False
+
             if current_block.previous_hash != previous_block.hash:
                 return False
 
@@ -395,12 +761,12 @@ class P2PNode:
     
     def check_blockchain_integrity(self):
         # Verificar cada bloque individualmente
-        for i, block in enumerate(self.blockchain.chain):
+        for block in self.blockchain.chain:
             calculated_hash = block.calculate_hash()
             if calculated_hash != block.hash:
                 return {
                     "valid": False,
-                    "tampered_block": i,
+                    "tampered_block": block.index,
                     "stored_hash": block.hash,
                     "calculated_hash": calculated_hash
                 }
@@ -408,17 +774,16 @@ class P2PNode:
             if self.blockchain.chain[i].previous_hash != self.blockchain.chain[i-1].hash:
                 return {
                     "valid": False,
-                    "tampered_block": i,
+                    "tampered_block": self.blockchain.chain[i].index,
                     "issue": "previous_hash_mismatch"
                 }
     
         return {"valid": True}
     
     def simulate_hack(self, block_index):
-        if block_index >= len(self.blockchain.chain):
-            return {"success": False, "message": "Índice de bloque fuera de rango"}
-    
-        block = self.blockchain.chain[block_index]
+        block = self.blockchain.get_block(block_index)
+        if block is None:
+            return {"success": False, "message": "Índice de bloque fuera de rango o podado"}
     
         # Verificar si hay transacciones en el bloque
         if not block.transactions:
@@ -469,9 +834,9 @@ class P2PNetwork:
     def __init__(self):
         self.nodes = {}
 
-    def add_node(self, node_id, port):
+    def add_node(self, node_id, port, prune_history=False):
         try:
-            node = P2PNode(node_id, port)
+            node = P2PNode(node_id, port, prune_history)
             self.nodes[node_id] = node
             print(f"Nodo {node_id} añadido a la red en puerto {port}")
             return node
@@ -502,6 +867,7 @@ def add_node():
     try:
         node_id = request.form.get('node_id')
         port = int(request.form.get('port'))
+        prune_history = request.form.get('prune') in ('1', 'true', 'on')
 
         if node_id in network.nodes:
             return jsonify({"success": False, "message": f"El nodo {node_id} ya existe"}), 400
@@ -510,7 +876,7 @@ def add_node():
             if existing_node.port == port:
                 return jsonify({"success": False, "message": f"El puerto {port} ya está en uso"}), 400
 
-        node = network.add_node(node_id, port)
+        node = network.add_node(node_id, port, prune_history)
         if node:
             return jsonify({"success": True, "message": f"Nodo {node_id} creado en puerto {port}"})
         else:
@@ -587,12 +953,29 @@ def verify_blockchain():
             "success": True,
             "node_id": node_id,
             "blockchain_valid": is_valid,
-            "blockchain_length": len(node.blockchain.chain),
+            "blockchain_length": node.blockchain.get_length(),
             "blockchain": blockchain_data
         })
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+@app.route('/api/snapshot', methods=['GET'])
+def get_snapshot():
+    try:
+        node_id = request.args.get('node_id')
+        if node_id not in network.nodes:
+            return jsonify({"success": False, "message": f"El nodo {node_id} no existe"}), 400
+
+        node = network.nodes[node_id]
+        return jsonify({
+            "success": True,
+            "node_id": node_id,
+            "snapshot": node.blockchain.snapshot,
+            "first_block": node.blockchain.chain[0].index
+        })
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
 @app.route('/api/check_integrity', methods=['GET'])
 def check_integrity():
     try:
@@ -0,0 +1,429 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Todos los procesos de la simulación comparten una clave de firma de snapshots
+os.environ.setdefault("WOODSAFE_SNAPSHOT_KEY", secrets.token_hex(16))
+
+# blockchain.py vive junto a este script; así se puede lanzar desde cualquier
+# directorio. Importarlo crea la app Flask, pero los nodos nunca la arrancan.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from blockchain import P2PNode  # noqa: E402
+
+
+# Nodo que se ejecuta en su propio proceso e inyecta fallos de red
+class SimulatedNode(P2PNode):
+    def __init__(self, node_id, port, peers, latency=0.0, jitter=0.0, loss=0.0,
+                 sync_interval=2.0, prune_history=False, difficulty=2, sync_delay=0.0):
+        # Se fijan antes de llamar al padre, que ya sincroniza con los peers
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        super().__init__(node_id, port, prune_history, peers)
+        self.blockchain.difficulty = difficulty
+        self.sync_delay = sync_delay
+
+        threading.Thread(target=self.anti_entropy_loop, args=(sync_interval,), daemon=True).start()
+
+    def connect_to_peer(self, peer_id):
+        """Añade latencia a cada conexión saliente y rechaza una fracción de ellas.
+
+        La pérdida se simula a nivel de conexión: el mensaje completo no se
+        envía. No se pierden ni retrasan datos a mitad de una transferencia.
+        """
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if random.random() < self.loss:
+            raise ConnectionError(f"Conexión perdida hacia {peer_id} (simulado)")
+        return super().connect_to_peer(peer_id)
+
+    def anti_entropy_loop(self, interval):
+        """Sincroniza periódicamente para recuperar mensajes perdidos o nodos caídos"""
+        while True:
+            time.sleep(interval)
+            try:
+                self.sync_with_peers()
+            except Exception as e:
+                print(f"[Nodo {self.node_id}] Error en la sincronización periódica: {e}")
+
+    def handle_command(self, client_socket, command, args):
+        if command == "SIM_UPLOAD":
+            size = int(args[0])
+            # Nombre único: no colisiona entre hilos ni con archivos de antes de una caída
+            with tempfile.NamedTemporaryFile(dir=".", prefix=f"upload_{self.node_id}_",
+                                             suffix=".tmp", delete=False) as f:
+                f.write(os.urandom(size))
+                filepath = f.name
+            try:
+                file_hash = self.upload_file(filepath)
+            finally:
+                os.remove(filepath)
+            response = f"OK::{file_hash}" if file_hash else "FAIL"
+            client_socket.sendall(response.encode())
+        elif command == "SIM_DOWNLOAD":
+            peer_id, file_hash = args
+            if file_hash in self.files:
+                client_socket.sendall("ALREADY_PRESENT".encode())
+                return
+            success = self.request_file(peer_id, file_hash)
+            client_socket.sendall(("OK" if success else "FAIL").encode())
+        elif command == "SIM_STATUS":
+            last_block = self.blockchain.get_last_block()
+            file_index, _ = self.blockchain.compute_state()
+            P2PNode.send_payload(client_socket, "STATUS", {
+                "node_id": self.node_id,
+                "length": self.blockchain.get_length(),
+                "tip": last_block.hash,
+                "stored_blocks": len(self.blockchain.chain),
+                "files": len(self.files),
+                "chain_file_hashes": sorted(file_index)
+            })
+        else:
+            super().handle_command(client_socket, command, args)
+
+
+def run_node(node_id, port, peers, options, workdir):
+    """Punto de entrada de cada proceso hijo"""
+    os.chdir(workdir)
+    if not options["verbose"]:
+        sys.stdout = open(os.devnull, "w")
+    random.seed()
+    SimulatedNode(
+        node_id, port, peers,
+        latency=options["latency"],
+        jitter=options["jitter"],
+        loss=options["loss"],
+        sync_interval=options["sync_interval"],
+        prune_history=options["prune"],
+        difficulty=options["difficulty"],
+        sync_delay=options["sync_delay"]
+    )
+    while True:
+        time.sleep(1)
+
+
+# Cliente de control: habla con los nodos únicamente por sus puertos TCP
+def send_command(port, message, timeout=60):
+    client = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+    try:
+        client.sendall(message.encode())
+        return client.recv(4096).decode()
+    finally:
+        client.close()
+
+
+def fetch_status(port, timeout=5):
+    client = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+    try:
+        client.sendall("SIM_STATUS".encode())
+        response = client.recv(1024).decode()
+        if not response.startswith("STATUS::"):
+            return None
+        return P2PNode.receive_payload(client, int(response.split("::")[1]))
+    finally:
+        client.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class NetworkSimulator:
+    def __init__(self, args):
+        self.args = args
+        self.workdir = args.workdir or tempfile.mkdtemp(prefix="woodsafe_sim_")
+        os.makedirs(self.workdir, exist_ok=True)
+        self.ports = {f"N{i}": args.base_port + i for i in range(args.nodes)}
+        self.processes = {}
+        self.alive = set()
+        self.lock = threading.Lock()
+        self.uploaded = []  # (node_id, file_hash)
+        self.holders = {}  # file_hash -> nodos que tienen el archivo en disco
+        self.crash_count = 0
+        self.options = {
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "loss": args.loss,
+            "sync_interval": args.sync_interval,
+            "prune": args.prune,
+            "difficulty": args.difficulty,
+            "sync_delay": args.sync_delay,
+            "verbose": args.verbose
+        }
+
+    def start_node(self, node_id):
+        peers = {peer_id: port for peer_id, port in self.ports.items() if peer_id != node_id}
+        process = multiprocessing.Process(
+            target=run_node,
+            args=(node_id, self.ports[node_id], peers, self.options, self.workdir),
+            daemon=True
+        )
+        process.start()
+        self.processes[node_id] = process
+        self.wait_until_ready(node_id)
+        with self.lock:
+            self.alive.add(node_id)
+
+    def wait_until_ready(self, node_id, timeout=30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                if fetch_status(self.ports[node_id]):
+                    return
+            except OSError:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError(f"El nodo {node_id} no respondió en {timeout}s")
+
+    def crash_node(self, node_id):
+        with self.lock:
+            if node_id not in self.alive:
+                return
+            self.alive.discard(node_id)
+            self.crash_count += 1
+            # Al reiniciar, el nodo pierde su índice de archivos en memoria
+            for holders in self.holders.values():
+                holders.discard(node_id)
+        self.processes[node_id].kill()
+        self.processes[node_id].join()
+        print(f"💥 Nodo {node_id} caído")
+        if self.args.restart_after >= 0:
+            time.sleep(self.args.restart_after)
+            self.start_node(node_id)
+            print(f"🔁 Nodo {node_id} reiniciado")
+
+    def schedule_crashes(self, duration):
+        """Programa caídas aleatorias repartidas a lo largo de la carga de trabajo"""
+        threads = []
+        for _ in range(self.args.crashes):
+            def crash():
+                time.sleep(random.uniform(0, duration))
+                with self.lock:
+                    candidates = sorted(self.alive)
+                if len(candidates) > 1:
+                    self.crash_node(random.choice(candidates))
+            thread = threading.Thread(target=crash, daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def random_alive_node(self, exclude=None):
+        with self.lock:
+            candidates = sorted(node_id for node_id in self.alive if node_id != exclude)
+        return random.choice(candidates) if candidates else None
+
+    # Cada operación devuelve (resultado, latencia); solo "ok" cuenta para el throughput
+    def upload_once(self, _):
+        node_id = self.random_alive_node()
+        if node_id is None:
+            return "no_node", None
+        start = time.time()
+        try:
+            response = send_command(self.ports[node_id], f"SIM_UPLOAD::{self.args.file_size}")
+        except OSError:
+            return "failed", None
+        if not response.startswith("OK::"):
+            return "failed", None
+        file_hash = response.split("::")[1]
+        with self.lock:
+            self.uploaded.append((node_id, file_hash))
+            self.holders.setdefault(file_hash, set()).add(node_id)
+        return "ok", time.time() - start
+
+    def download_once(self, _):
+        with self.lock:
+            if not self.uploaded:
+                return "no_file", None
+            _, file_hash = random.choice(self.uploaded)
+            holders = self.holders[file_hash] & self.alive
+            targets = sorted(self.alive - self.holders[file_hash])
+        if not holders:
+            return "owner_lost_file", None
+        if not targets:
+            return "already_present", None
+        owner_id = random.choice(sorted(holders))
+        node_id = random.choice(targets)
+        start = time.time()
+        try:
+            response = send_command(self.ports[node_id], f"SIM_DOWNLOAD::{owner_id}::{file_hash}")
+        except OSError:
+            return "failed", None
+        if response == "ALREADY_PRESENT":
+            return "already_present", None
+        if response != "OK":
+            return "failed", None
+        with self.lock:
+            self.holders[file_hash].add(node_id)
+        return "ok", time.time() - start
+
+    def run_phase(self, name, operation, count):
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as executor:
+            results = list(executor.map(operation, range(count)))
+        elapsed = time.time() - start
+        outcomes = {}
+        for outcome, _ in results:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        latencies = [latency for outcome, latency in results if outcome == "ok"]
+        ok = len(latencies)
+        return {
+            "phase": name,
+            "requested": count,
+            "ok": ok,
+            "outcomes": outcomes,
+            "elapsed_s": round(elapsed, 3),
+            "ops_per_s": round(ok / elapsed, 3) if elapsed > 0 else 0.0,
+            "mb_per_s": round(ok * self.args.file_size / elapsed / 1e6, 3) if elapsed > 0 else 0.0,
+            "latency_p50_s": round(percentile(latencies, 0.5), 3),
+            "latency_p95_s": round(percentile(latencies, 0.95), 3)
+        }
+
+    def wait_for_convergence(self):
+        """Mide dos tiempos: hasta que todos los nodos vivos comparten el mismo
+        tip, y hasta que ese tip incluye todas las subidas confirmadas.
+
+        Si los tips coinciden sin cambios durante dos intervalos de
+        sincronización pero faltan subidas, se dejan de esperar: esas
+        transacciones se han perdido.
+        """
+        start = time.time()
+        statuses = []
+        stable_tip, tips_since = None, None
+        uploads_time = None
+        on_chain = set()
+        with self.lock:
+            uploaded_hashes = {file_hash for _, file_hash in self.uploaded}
+        while time.time() - start < self.args.convergence_timeout:
+            with self.lock:
+                alive = sorted(self.alive)
+            statuses = []
+            for node_id in alive:
+                try:
+                    statuses.append(fetch_status(self.ports[node_id]))
+                except OSError:
+                    statuses.append(None)
+            tips = {status["tip"] for status in statuses if status}
+            if statuses and all(statuses) and len(tips) == 1:
+                tip = tips.pop()
+                if tip != stable_tip:
+                    stable_tip, tips_since = tip, time.time()
+                on_chain = uploaded_hashes & set(statuses[0]["chain_file_hashes"])
+                if on_chain == uploaded_hashes:
+                    uploads_time = time.time() - start
+                    break
+                if time.time() - tips_since >= 2 * self.args.sync_interval:
+                    break
+            else:
+                stable_tip, tips_since = None, None
+            time.sleep(0.1)
+        tips_time = tips_since - start if tips_since is not None else None
+        return tips_time, uploads_time, statuses, len(on_chain)
+
+    def run(self):
+        print(f"🚀 Iniciando {self.args.nodes} nodos en {self.workdir}")
+        for node_id in self.ports:
+            self.start_node(node_id)
+
+        try:
+            estimated = (self.args.uploads + self.args.downloads) * 0.1 / max(1, self.args.concurrency)
+            crash_threads = self.schedule_crashes(max(1.0, estimated))
+
+            phases = [
+                self.run_phase("upload", self.upload_once, self.args.uploads),
+                self.run_phase("download", self.download_once, self.args.downloads)
+            ]
+            for thread in crash_threads:
+                thread.join()
+
+            tips_time, uploads_time, statuses, on_chain = self.wait_for_convergence()
+            for status in statuses:
+                if status:
+                    status["chain_files"] = len(status.pop("chain_file_hashes"))
+            return {
+                "nodes": self.args.nodes,
+                "crashes": self.crash_count,
+                "phases": phases,
+                "uploads_acknowledged": len(self.uploaded),
+                "uploads_on_chain": on_chain,
+                "tips_converged": tips_time is not None,
+                "tips_convergence_time_s": round(tips_time, 3) if tips_time is not None else None,
+                "converged": uploads_time is not None,
+                "convergence_time_s": round(uploads_time, 3) if uploads_time is not None else None,
+                "final_status": statuses
+            }
+        finally:
+            for process in self.processes.values():
+                process.kill()
+
+
+def print_report(report):
+    print("\n📊 Resultado de la simulación")
+    print(f"Nodos: {report['nodes']}  Caídas: {report['crashes']}")
+    for phase in report["phases"]:
+        print(
+            f"  {phase['phase']:<8} ok {phase['ok']}/{phase['requested']}  "
+            f"{phase['ops_per_s']} ops/s  {phase['mb_per_s']} MB/s  "
+            f"p50 {phase['latency_p50_s']}s  p95 {phase['latency_p95_s']}s"
+        )
+        other = {outcome: n for outcome, n in phase["outcomes"].items() if outcome != "ok"}
+        if other:
+            print(f"           otros resultados: {other}")
+    print(f"Subidas en la cadena: {report['uploads_on_chain']}/{report['uploads_acknowledged']}")
+    if report["tips_converged"]:
+        length = report["final_status"][0]["length"]
+        print(f"Tips iguales en: {report['tips_convergence_time_s']}s (longitud de la cadena {length})")
+    else:
+        print("Tips iguales: no alcanzado dentro del tiempo límite")
+    if report["converged"]:
+        print(f"Todas las subidas en la cadena común en: {report['convergence_time_s']}s")
+    else:
+        lost = report["uploads_acknowledged"] - report["uploads_on_chain"]
+        print(f"Convergencia de subidas: no alcanzada ({lost} subidas confirmadas no están en la cadena común)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulador multiproceso de la red P2P de WoodSafe")
+    parser.add_argument("--nodes", type=int, default=4, help="Número de nodos (procesos)")
+    parser.add_argument("--base-port", type=int, default=9200, help="Puerto del primer nodo")
+    parser.add_argument("--uploads", type=int, default=20, help="Subidas a realizar")
+    parser.add_argument("--downloads", type=int, default=20, help="Descargas a realizar")
+    parser.add_argument("--file-size", type=int, default=4096, help="Tamaño de cada archivo en bytes")
+    parser.add_argument("--concurrency", type=int, default=4, help="Operaciones simultáneas")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latencia añadida por conexión (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variación aleatoria de la latencia (s)")
+    parser.add_argument("--loss", type=float, default=0.0, help="Probabilidad de rechazar una conexión saliente entre nodos (se pierde el mensaje completo)")
+    parser.add_argument("--crashes", type=int, default=0, help="Caídas de nodos a inyectar")
+    parser.add_argument("--restart-after", type=float, default=2.0,
+                        help="Segundos hasta reiniciar un nodo caído (negativo: no reiniciar)")
+    parser.add_argument("--difficulty", type=int, default=2, help="Dificultad de minado")
+    parser.add_argument("--sync-delay", type=float, default=0.0, help="Espera tras minar antes de propagar (s)")
+    parser.add_argument("--sync-interval", type=float, default=2.0, help="Intervalo de sincronización periódica (s)")
+    parser.add_argument("--convergence-timeout", type=float, default=60.0, help="Tiempo máximo de convergencia (s)")
+    parser.add_argument("--prune", action="store_true", help="Podar los bloques anteriores al checkpoint")
+    parser.add_argument("--workdir", help="Directorio de trabajo de los nodos")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado en JSON")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida de los nodos")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    report = NetworkSimulator(args).run()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
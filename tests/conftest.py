@@ -0,0 +1,45 @@
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "blockchain"))
+
+from blockchain import P2PNode  # noqa: E402
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def network(tmp_path, monkeypatch):
+    """Red en proceso aislada en un directorio temporal"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("WOODSAFE_SNAPSHOT_KEY", "clave-de-prueba")
+    monkeypatch.setattr(P2PNode, "nodes", {})
+
+    def make_node(node_id, prune_history=False):
+        node = P2PNode(node_id, free_port(), prune_history)
+        node.sync_delay = 0
+        node.blockchain.difficulty = 1
+        return node
+
+    return make_node
+
+
+@pytest.fixture
+def upload(tmp_path):
+    counter = {"n": 0}
+
+    def upload_to(node, count=1):
+        for _ in range(count):
+            counter["n"] += 1
+            path = tmp_path / f"archivo_{counter['n']}.txt"
+            path.write_text(f"contenido {counter['n']}")
+            node.upload_file(str(path))
+
+    return upload_to
@@ -0,0 +1,123 @@
+import socket
+import threading
+import time
+
+from blockchain import Block, Blockchain, P2PNode, Transaction
+from conftest import free_port
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_payload_framing_round_trip():
+    payload = {"chain": [{"data": "x" * 200000}], "snapshot": None}
+    left, right = socket.socketpair()
+    try:
+        sender = threading.Thread(target=P2PNode.send_payload, args=(left, "BLOCKCHAIN", payload))
+        sender.start()
+        command, size = right.recv(1024).decode().split("::")
+        assert command == "BLOCKCHAIN"
+        assert P2PNode.receive_payload(right, int(size)) == payload
+        sender.join()
+    finally:
+        left.close()
+        right.close()
+
+
+def test_tcp_node_syncs_and_pushes_chain(network, upload):
+    a = network("A")
+    upload(a, 3)
+
+    b = P2PNode("B", free_port(), peers={"A": a.port})
+    assert b.blockchain.get_length() == 4
+    assert b.blockchain.get_last_block().hash == a.blockchain.get_last_block().hash
+
+    b.blockchain.difficulty = 1
+    b.blockchain.add_transaction(Transaction("B", "NETWORK", 1, "hash-b"))
+    b.blockchain.mine_pending_transactions("B")
+    assert b.send_message("A", "BLOCKCHAIN", b.chain_payload())
+
+    assert wait_for(lambda: a.blockchain.get_length() == 5)
+    assert a.check_blockchain_integrity() == {"valid": True}
+
+
+def test_request_full_chain_from_pruned_peer_starts_at_checkpoint(network, upload):
+    a = network("A", prune_history=True)
+    upload(a, 6)
+    b = P2PNode("B", free_port(), peers={"A": a.port})
+
+    partial = b.request_chain("A")
+    full = b.request_chain("A", full=True)
+
+    assert partial["chain"][0]["index"] == a.blockchain.snapshot["index"]
+    assert full["chain"][0]["index"] == a.blockchain.chain[0].index
+    # B arranca desde el snapshot, pero nadie conserva el historial anterior
+    assert b.blockchain.get_length() == 7
+    assert wait_for(lambda: b.blockchain.chain[0].index == 5)
+
+
+def test_receive_waits_for_block_being_mined(network, monkeypatch):
+    other = Blockchain()
+    other.difficulty = 1
+    for i in range(3):
+        other.add_transaction(Transaction("X", "NETWORK", 1, f"hash-x-{i}"))
+        other.mine_pending_transactions("X")
+    chain_data = [block.to_dict() for block in other.chain]
+
+    b = network("B")
+    mining_started = threading.Event()
+    original_mine_block = Block.mine_block
+
+    def slow_mine_block(block, difficulty):
+        mining_started.set()
+        time.sleep(0.3)
+        original_mine_block(block, difficulty)
+
+    monkeypatch.setattr(Block, "mine_block", slow_mine_block)
+    b.blockchain.add_transaction(Transaction("B", "NETWORK", 1, "hash-b"))
+    miner = threading.Thread(target=b.blockchain.mine_pending_transactions, args=("B",))
+    miner.start()
+    assert mining_started.wait(5)
+
+    assert b.receive_blockchain(chain_data)
+    miner.join()
+
+    assert b.blockchain.get_length() == 4
+    assert b.check_blockchain_integrity() == {"valid": True}
+
+
+def test_fork_switch_remines_orphaned_uploads(network):
+    other = Blockchain()
+    other.difficulty = 1
+    for i in range(2):
+        other.add_transaction(Transaction("X", "NETWORK", 1, f"hash-x-{i}"))
+        other.mine_pending_transactions("X")
+    chain_data = [block.to_dict() for block in other.chain]
+
+    a = network("A")
+    a.blockchain.add_transaction(Transaction("A", "NETWORK", 1, "hash-a"))
+    a.blockchain.mine_pending_transactions("A")
+
+    assert a.receive_blockchain(chain_data)
+    assert wait_for(lambda: "hash-a" in a.blockchain.compute_state()[0])
+    assert a.blockchain.get_length() == 4
+    assert a.check_blockchain_integrity() == {"valid": True}
+
+
+def test_stalled_peer_connection_times_out(network):
+    a = network("A")
+    a.client_timeout = 0.2
+    client = socket.create_connection(("127.0.0.1", a.port), timeout=5)
+    try:
+        # Cabecera de un mensaje que nunca llega completo
+        client.sendall("BLOCKCHAIN::1000".encode())
+        assert client.recv(1024) == b"READY"
+        assert client.recv(1024) == b""
+    finally:
+        client.close()
@@ -0,0 +1,104 @@
+import hashlib
+import hmac
+
+from blockchain import Blockchain, P2PNode, Transaction
+
+
+def test_tampered_block_before_checkpoint_is_rejected(network, upload):
+    a = network("A")
+    b = network("B")
+    upload(a, 6)
+    assert b.blockchain.snapshot["index"] == 5
+
+    a.simulate_hack(2)
+    upload(a, 1)
+
+    assert b.blockchain.get_length() == 7
+    assert b.check_blockchain_integrity() == {"valid": True}
+
+
+def test_snapshot_signature_is_checked(network, upload, monkeypatch):
+    a = network("A")
+    upload(a, 5)
+    snapshot = a.blockchain.snapshot
+    assert Blockchain.verify_snapshot(snapshot)
+
+    assert not Blockchain.verify_snapshot(dict(snapshot, signature="0" * 64))
+    forged = dict(snapshot, balances={"A": 1000})
+    forged["digest"] = Blockchain.snapshot_digest(forged)
+    assert not Blockchain.verify_snapshot(forged)
+
+    monkeypatch.delenv("WOODSAFE_SNAPSHOT_KEY")
+    assert not Blockchain.verify_snapshot(snapshot)
+
+
+def test_prune_node_bootstraps_from_checkpoint(network, upload):
+    a = network("A", prune_history=True)
+    upload(a, 7)
+
+    c = network("C", prune_history=True)
+
+    assert c.blockchain.get_length() == 8
+    assert c.blockchain.chain[0].index == 5
+    file_index, _ = c.blockchain.compute_state()
+    assert len(file_index) == 7
+
+
+def test_prune_node_refuses_snapshot_without_key(network, upload, monkeypatch):
+    a = network("A", prune_history=True)
+    upload(a, 7)
+    monkeypatch.delenv("WOODSAFE_SNAPSHOT_KEY")
+
+    c = network("C", prune_history=True)
+
+    assert c.blockchain.get_length() == 1
+
+
+def test_full_history_node_bootstraps_then_backfills(network, upload, monkeypatch):
+    a = network("A")
+    upload(a, 7)
+    network("P", prune_history=True)
+    with monkeypatch.context() as patch:
+        patch.setattr(P2PNode, "backfill_history", lambda node, fetch_payloads: None)
+        c = network("C")
+
+    # Arranca desde el checkpoint sin validar los bloques anteriores
+    assert c.blockchain.get_length() == 8
+    assert c.blockchain.chain[0].index == 5
+
+    others = [node for node in P2PNode.nodes.values() if node is not c]
+    assert c.backfill_history(lambda full: [node.chain_payload(full) for node in others])
+    assert [block.index for block in c.blockchain.chain] == list(range(8))
+    assert c.blockchain.snapshot["index"] == 5
+    assert c.check_blockchain_integrity() == {"valid": True}
+
+
+def test_backfill_discards_snapshot_that_contradicts_history(network, upload, monkeypatch):
+    a = network("A")
+    upload(a, 7)
+    forged = dict(a.blockchain.snapshot, balances={"A": 1000})
+    forged["digest"] = Blockchain.snapshot_digest(forged)
+    forged["signature"] = hmac.new(b"clave-de-prueba", forged["digest"].encode(), hashlib.sha256).hexdigest()
+    with monkeypatch.context() as patch:
+        patch.setattr(P2PNode, "backfill_history", lambda node, fetch_payloads: None)
+        c = network("C")
+    c.blockchain.snapshot = forged
+
+    assert c.backfill_history(lambda full: [a.chain_payload(full)])
+    assert c.blockchain.snapshot is None
+    assert c.blockchain.compute_state()[1]["A"] == -7
+
+
+def test_full_history_node_splices_partial_chain(network, upload):
+    a = network("A")
+    b = network("B")
+    upload(a, 7)
+    # Bloque minado en B sin propagarlo
+    b.blockchain.add_transaction(Transaction("B", "NETWORK", 1, "hash-b"))
+    b.blockchain.mine_pending_transactions("B")
+
+    payload = b.chain_payload()
+    assert payload["chain"][0]["index"] == 5
+    assert a.receive_blockchain(payload["chain"], payload["snapshot"])
+    assert [block.index for block in a.blockchain.chain] == list(range(9))
+    assert a.check_blockchain_integrity() == {"valid": True}